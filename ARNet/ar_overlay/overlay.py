@@ -1,37 +1,200 @@
 import cv2
 import numpy as np
-from datetime import datetime
+import string
+
+# Fonts
+TITLE_FONT = cv2.FONT_HERSHEY_SIMPLEX
+INFO_FONT = cv2.FONT_HERSHEY_PLAIN
+
+# Colors (BGR format)
+COLORS = {
+    'green': (0, 255, 0),
+    'red': (0, 0, 255),
+    'blue': (255, 165, 0),
+    'white': (255, 255, 255),
+    'black': (0, 0, 0),
+    'yellow': (0, 255, 255)
+}
+
+# Text settings
+TITLE_SCALE = 0.8
+INFO_SCALE = 1.0
+LINE_TYPE = 2
+PADDING = 10
+
+# Panel layout
+TEXT_HEIGHT = 30
+TITLE_HEIGHT = 40
+BOX_WIDTH = 300  # Reduced width for simpler display
 
 class AROverlay:
     def __init__(self):
         """Initialize AR overlay with enhanced settings."""
-        # Fonts
-        self.title_font = cv2.FONT_HERSHEY_SIMPLEX
-        self.info_font = cv2.FONT_HERSHEY_PLAIN
-        
-        # Colors (BGR format)
-        self.colors = {
-            'green': (0, 255, 0),
-            'red': (0, 0, 255),
-            'blue': (255, 165, 0),
-            'white': (255, 255, 255),
-            'black': (0, 0, 0),
-            'yellow': (0, 255, 255)
-        }
-        
-        # Text settings
-        self.title_scale = 0.8
-        self.info_scale = 1.0
-        self.line_type = 2
-        self.padding = 10
+        # Glyphs are rasterized once and copied into the panel by _blit_text
+        self._title_glyphs = self._build_glyph_atlas(TITLE_FONT, TITLE_SCALE)
+        self._info_glyphs = self._build_glyph_atlas(INFO_FONT, INFO_SCALE)
+
+        # Rendered panel cache; diagnostics change every few seconds while
+        # draw_overlay runs every frame, so the text is only drawn on change
+        self._diagnostics = None
+        self._panel_key = None
+        self._box_height = 0
+        self._panel = None
+        self._panel_weights = None
+        self._frame_weights = None
 
     def _get_status_color(self, value, threshold=100):
         """Get color based on status value."""
         if value is None:
-            return self.colors['red']
+            return COLORS['red']
         if isinstance(value, (int, float)):
-            return self.colors['green'] if value < threshold else self.colors['yellow']
-        return self.colors['blue']
+            return COLORS['green'] if value < threshold else COLORS['yellow']
+        return COLORS['blue']
+
+    def _build_glyph_atlas(self, font, scale):
+        """
+        Rasterize every printable ASCII character for one font.
+        
+        Args:
+            font: OpenCV font face
+            scale: Font scale
+            
+        Returns:
+            dict: Character coverage masks with their advance widths, plus
+            the baseline offset and margin shared by all masks
+        """
+        margin = LINE_TYPE
+        (_, ascent), descent = cv2.getTextSize(string.digits + string.ascii_letters + string.punctuation,
+                                               font, scale, LINE_TYPE)
+        top = ascent + margin
+        height = top + descent + margin
+        
+        glyphs = {}
+        for ch in string.printable:
+            (width, _), _ = cv2.getTextSize(ch, font, scale, LINE_TYPE)
+            # Distance to the next character, without the trailing stroke width
+            advance = cv2.getTextSize(ch * 2, font, scale, LINE_TYPE)[0][0] - width
+            coverage = np.zeros((height, width + 2 * margin), dtype=np.uint8)
+            cv2.putText(coverage, ch, (margin, top), font, scale, 255, LINE_TYPE)
+            glyphs[ch] = (coverage.astype(np.float32) / 255, advance)
+        
+        return {'glyphs': glyphs, 'top': top, 'margin': margin}
+
+    def _blit_text(self, canvas, x, y, text, color, atlas):
+        """
+        Composite text onto an image from a pre-rendered glyph atlas.
+        
+        Args:
+            canvas: Image to draw on, single or multi channel
+            x, y: Bottom-left corner of the text, as in cv2.putText
+            text: Text to draw; characters outside the atlas render as '?'
+            color: Text color, a scalar for single channel images
+            atlas: Glyph atlas from _build_glyph_atlas
+        """
+        glyphs = atlas['glyphs']
+        top = y - atlas['top']
+        color = np.asarray(color, dtype=np.float32)
+        
+        for ch in text:
+            coverage, advance = glyphs.get(ch, glyphs['?'])
+            left = x - atlas['margin']
+            x += advance
+            
+            # Clip the glyph to the canvas
+            y0, x0 = max(top, 0), max(left, 0)
+            y1 = min(top + coverage.shape[0], canvas.shape[0])
+            x1 = min(left + coverage.shape[1], canvas.shape[1])
+            if y0 >= y1 or x0 >= x1:
+                continue
+            
+            alpha = coverage[y0 - top:y1 - top, x0 - left:x1 - left]
+            if canvas.ndim == 3:
+                alpha = alpha[:, :, np.newaxis]
+            region = canvas[y0:y1, x0:x1]
+            region[:] = region * (1 - alpha) + color * alpha + 0.5
+
+    def _render_panel(self, info_text, status_color):
+        """
+        Render the title bar and info text into a standalone panel.
+        
+        Args:
+            info_text: Lines of text to draw below the title
+            status_color: BGR color of the title bar
+            
+        Returns:
+            tuple: (panel image, panel opacity, frame opacity)
+        """
+        # Leave room for descenders of the last line below the background
+        panel_height = len(info_text) * TEXT_HEIGHT + PADDING * 3
+        
+        # Text is white, so the panel only needs its color under the title
+        # bar; the alpha channel holds the text coverage elsewhere
+        panel = np.full((panel_height, BOX_WIDTH, 3), 255, dtype=np.uint8)
+        alpha = np.zeros((panel_height, BOX_WIDTH), dtype=np.uint8)
+        
+        # Draw title bar
+        panel[0:TITLE_HEIGHT] = status_color
+        alpha[0:TITLE_HEIGHT] = 255
+        
+        # Draw title and information
+        lines = [("Network Status", (PADDING, 25), self._title_glyphs)]
+        for i, text in enumerate(info_text):
+            y = TITLE_HEIGHT + PADDING + (i * TEXT_HEIGHT)
+            lines.append((text, (PADDING, y), self._info_glyphs))
+        
+        for text, (x, y), atlas in lines:
+            self._blit_text(panel, x, y, text, COLORS['white'], atlas)
+            self._blit_text(alpha, x, y, text, 255, atlas)
+        
+        weights = alpha.astype(np.float32) / 255
+        return panel, weights, 1 - weights
+
+    def _format_info(self, diagnostics):
+        """
+        Build the panel text and title color for a diagnostics snapshot.
+        
+        Args:
+            diagnostics: Device diagnostics from DeviceResolver
+            
+        Returns:
+            tuple: (info text lines, status color)
+        """
+        # Get device status
+        device_id = diagnostics.get('device_id', 'Unknown')
+        ip = diagnostics.get('ip', 'Unknown')
+        ping_stats = diagnostics.get('ping', {})
+        ports = diagnostics.get('ports', {})
+        
+        # Calculate status color based on ping average
+        ping_avg = ping_stats.get('avg') if ping_stats else None
+        status_color = self._get_status_color(ping_avg)
+        
+        # Create simplified info text
+        info_text = [
+            f"Device: {device_id}",
+            f"IP: {ip}",
+        ]
+        
+        # Add ping information
+        if ping_stats:
+            status = ping_stats.get('status', 'unknown')
+            info_text.extend([
+                f"Status: {status.upper()}",
+                f"Ping: {ping_stats.get('avg', 'N/A')}ms",
+                f"Loss: {ping_stats.get('loss', 'N/A')}"
+            ])
+        else:
+            info_text.append("Status: No response")
+        
+        # Add essential port information
+        if ports:
+            info_text.append("Ports:")
+            for port, port_info in sorted(ports.items()):
+                service = port_info.get('service', 'Unknown')
+                status = port_info.get('status', 'unknown')
+                info_text.append(f"  {service}: {status}")
+        
+        return tuple(info_text), status_color
 
     def draw_overlay(self, frame, diagnostics):
         """Draw enhanced network diagnostics overlay."""
@@ -39,71 +202,33 @@ class AROverlay:
             return frame
 
         try:
-            # Get device status
-            device_id = diagnostics.get('device_id', 'Unknown')
-            ip = diagnostics.get('ip', 'Unknown')
-            ping_stats = diagnostics.get('ping', {})
-            ports = diagnostics.get('ports', {})
-            
-            # Calculate status color based on ping average
-            ping_avg = ping_stats.get('avg') if ping_stats else None
-            status_color = self._get_status_color(ping_avg)
-            
-            # Create simplified info text
-            info_text = [
-                f"Device: {device_id}",
-                f"IP: {ip}",
-            ]
-            
-            # Add ping information
-            if ping_stats:
-                status = ping_stats.get('status', 'unknown')
-                info_text.extend([
-                    f"Status: {status.upper()}",
-                    f"Ping: {ping_stats.get('avg', 'N/A')}ms",
-                    f"Loss: {ping_stats.get('loss', 'N/A')}"
-                ])
-            else:
-                info_text.append("Status: No response")
-            
-            # Add essential port information
-            if ports:
-                info_text.append("Ports:")
-                for port, port_info in sorted(ports.items()):
-                    service = port_info.get('service', 'Unknown')
-                    status = port_info.get('status', 'unknown')
-                    info_text.append(f"  {service}: {status}")
-            
-            # Calculate box dimensions
-            text_height = 30
-            box_height = len(info_text) * text_height + self.padding * 2
-            box_width = 300  # Reduced width for simpler display
-            
-            # Draw semi-transparent background
-            overlay_rect = np.zeros((box_height, box_width, 3), dtype=np.uint8)
-            overlay_rect[:] = (40, 40, 40)  # Dark gray background
-            cv2.addWeighted(overlay_rect, 0.8, frame[0:box_height, 0:box_width], 0.2, 0, 
-                          frame[0:box_height, 0:box_width])
-            
-            # Draw title bar
-            title_height = 40
-            title_rect = np.zeros((title_height, box_width, 3), dtype=np.uint8)
-            title_rect[:] = status_color
-            frame[0:title_height, 0:box_width] = title_rect
+            # Diagnostics are replaced rather than mutated when they update,
+            # so the text only needs formatting for a new snapshot
+            if diagnostics is not self._diagnostics:
+                info_text, status_color = self._format_info(diagnostics)
+                
+                # Re-render the panel only when its contents change
+                key = (info_text, status_color)
+                if key != self._panel_key:
+                    self._panel, self._panel_weights, self._frame_weights = \
+                        self._render_panel(info_text, status_color)
+                    self._panel_key = key
+                    self._box_height = len(info_text) * TEXT_HEIGHT + PADDING * 2
+                self._diagnostics = diagnostics
             
-            # Draw title
-            cv2.putText(frame, f"Network Status", 
-                      (self.padding, 25),
-                      self.title_font, self.title_scale, self.colors['white'], 
-                      self.line_type)
+            # Draw semi-transparent dark gray background; blending with a
+            # constant color is a scale and offset of the frame itself
+            box_height = min(self._box_height, frame.shape[0])
+            box_width = min(BOX_WIDTH, frame.shape[1])
+            roi = frame[0:box_height, 0:box_width]
+            cv2.convertScaleAbs(roi, roi, 0.2, 40 * 0.8)
             
-            # Draw information
-            for i, text in enumerate(info_text):
-                y = title_height + self.padding + (i * text_height)
-                cv2.putText(frame, text,
-                          (self.padding, y),
-                          self.info_font, self.info_scale, self.colors['white'],
-                          self.line_type)
+            # Blend the cached title bar and text on top
+            panel_height = min(self._panel.shape[0], frame.shape[0])
+            roi = frame[0:panel_height, 0:box_width]
+            cv2.blendLinear(self._panel[:panel_height, :box_width], roi,
+                          self._panel_weights[:panel_height, :box_width],
+                          self._frame_weights[:panel_height, :box_width], roi)
             
             return frame
             
@@ -2,6 +2,8 @@ import cv2
 import sys
 import os
 import time
+import queue
+import threading
 import numpy as np
 
 # Add the project root to Python path
@@ -56,46 +58,211 @@ def list_cameras():
     
     return available_cameras
 
-def process_frame(frame, qr_scanner, last_scan_time, scan_interval=2.0):
-    """
-    Process a single frame for QR code detection.
-    
-    Args:
-        frame: Input frame from camera
-        qr_scanner: QR scanner instance
-        last_scan_time: Time of last successful scan
-        scan_interval: Minimum time between scans in seconds
-    
-    Returns:
-        tuple: (processed_frame, last_scan_time, device_info)
-    """
-    current_time = time.time()
-    
-    # Skip processing if not enough time has passed since last scan
-    if current_time - last_scan_time < scan_interval:
-        return frame, last_scan_time, None
-    
-    # Resize frame for faster processing (reduce to 50% of original size)
-    height, width = frame.shape[:2]
-    small_frame = cv2.resize(frame, (width//2, height//2))
-    
-    # Convert to grayscale for faster processing
-    gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
-    
-    # Try to detect QR code
-    try:
-        device_info = qr_scanner.scan(gray)
+class DiagnosticsWorker:
+    """Run network diagnostics off the camera loop."""
+
+    def __init__(self, device_resolver, ping_interval=3.0):
+        """
+        Start the background worker thread.
+        
+        Args:
+            device_resolver: Device resolver instance
+            ping_interval: Seconds between pings of the current device
+        """
+        self.device_resolver = device_resolver
+        self.ping_interval = ping_interval
+        
+        # Only the newest scan result is worth resolving
+        self._scans = queue.Queue(maxsize=1)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        
+        # Written by the worker under the lock, read by the camera loop
+        self.current_device = None
+        self.latest_diagnostics = None
+        
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def submit(self, device_info):
+        """Queue a QR scan result, replacing any result not yet resolved."""
+        try:
+            self._scans.put_nowait(device_info)
+        except queue.Full:
+            try:
+                self._scans.get_nowait()
+            except queue.Empty:
+                pass
+            self._scans.put_nowait(device_info)
+
+    def clear(self):
+        """Forget the current device and its diagnostics."""
+        with self._lock:
+            self.current_device = None
+            self.latest_diagnostics = None
+
+    def stop(self):
+        """Stop the worker thread."""
+        self._stopped.set()
+        self._thread.join(timeout=self.ping_interval)
+
+    def _worker(self):
+        """Resolve newly scanned devices and periodically re-ping the current one."""
+        last_ping_time = 0
+        while not self._stopped.is_set():
+            try:
+                device_info = self._scans.get(timeout=self.ping_interval)
+            except queue.Empty:
+                device_info = None
+            
+            # A bad payload or an unexpected error must not end the thread;
+            # later scans would queue up with nobody left to resolve them
+            try:
+                if device_info is not None:
+                    device_id = device_info.get('device_id')
+                    if device_id != self.current_device:
+                        print(f"\nNew device detected: {device_id}")
+                        with self._lock:
+                            self.current_device = device_id
+                            self.latest_diagnostics = None
+                        # Immediately ping and get diagnostics
+                        diagnostics = self.device_resolver.get_device_info(device_info)
+                        if diagnostics:
+                            print("Device info retrieved:")
+                            print(f"  Type: {diagnostics.get('type', 'unknown')}")
+                            print(f"  Location: {diagnostics.get('location', 'unknown')}")
+                            ping_stats = diagnostics.get('ping', {})
+                            if ping_stats:
+                                print(f"  Ping: {ping_stats.get('avg')}ms (min: {ping_stats.get('min')}ms, max: {ping_stats.get('max')}ms)")
+                                print(f"  Packet Loss: {ping_stats.get('loss')}")
+                        with self._lock:
+                            # The device may have been cleared in the meantime
+                            if self.current_device == device_id:
+                                self.latest_diagnostics = diagnostics
+                        last_ping_time = time.time()
+                
+                # Periodically re-ping the device while in view
+                diagnostics = self.latest_diagnostics
+                if diagnostics and (time.time() - last_ping_time >= self.ping_interval):
+                    # Only update ping stats
+                    ip = diagnostics.get('ip')
+                    if ip:
+                        ping_stats = self.device_resolver.ping(ip)
+                        print(f"[Re-ping] {diagnostics.get('device_id')} ({ip}): {ping_stats}")
+                        with self._lock:
+                            # Publish a new dict so the camera loop never sees a
+                            # half-updated one
+                            if self.latest_diagnostics is diagnostics:
+                                self.latest_diagnostics = dict(diagnostics, ping=ping_stats)
+                        last_ping_time = time.time()
+            except Exception as e:
+                print(f"Error in diagnostics worker: {e}")
+
+class FrameProcessor:
+    """Downscale camera frames for QR detection into reusable buffers."""
+
+    def __init__(self, width=640, height=480, motion_threshold=5.0):
+        """
+        Preallocate the half-size color and grayscale buffers.
+        
+        Args:
+            width: Expected camera frame width
+            height: Expected camera frame height
+            motion_threshold: Mean absolute gray level change between
+                frames above which the view counts as changed
+        """
+        self.motion_threshold = motion_threshold
+        self._last_attempt_time = 0
+        self._last_scan_found = False
+        self._allocate(width, height)
+
+    def _allocate(self, width, height):
+        """Allocate buffers for frames of the given size."""
+        self._frame_size = (width, height)
+        self._small = np.empty((height//2, width//2, 3), dtype=np.uint8)
+        self._gray = np.empty((height//2, width//2), dtype=np.uint8)
+        self._prev_gray = np.empty((height//2, width//2), dtype=np.uint8)
+        self._has_prev = False
+
+    def reset(self):
+        """Forget the previous frame so the next one is always scanned."""
+        self._has_prev = False
+
+    def process_frame(self, frame, qr_scanner, last_scan_time, scan_interval=2.0):
+        """
+        Process a single frame for QR code detection.
+        
+        Decoding is the most expensive step, so it only runs when the view
+        changed since the previous frame, or once per scan interval while
+        nothing has been found.
+        
+        Args:
+            frame: Input frame from camera
+            qr_scanner: QR scanner instance
+            last_scan_time: Time of last successful scan
+            scan_interval: Minimum time between scans in seconds
+        
+        Returns:
+            tuple: (processed_frame, last_scan_time, device_info)
+        """
+        current_time = time.time()
+        
+        # A background scanner answers for a frame submitted earlier; pick
+        # its result up as soon as it is ready, whether or not this frame
+        # gets submitted
+        device_info = qr_scanner.poll()
         if device_info:
+            self._last_scan_found = True
             return frame, current_time, device_info
-    except Exception as e:
-        print(f"Error processing frame: {e}")
-    
-    return frame, last_scan_time, None
+        
+        # Skip processing if not enough time has passed since last scan
+        if current_time - last_scan_time < scan_interval:
+            return frame, last_scan_time, None
+        
+        # Reallocate only if the camera delivers an unexpected size
+        height, width = frame.shape[:2]
+        if (width, height) != self._frame_size:
+            self._allocate(width, height)
+        
+        # Resize frame for faster processing (reduce to 50% of original size)
+        cv2.resize(frame, (width//2, height//2), dst=self._small)
+        
+        # Convert to grayscale for faster processing
+        gray = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        
+        # Cheap motion check against the previous frame
+        moved = (not self._has_prev or
+                 cv2.norm(gray, self._prev_gray, cv2.NORM_L1) / gray.size > self.motion_threshold)
+        np.copyto(self._prev_gray, gray)
+        self._has_prev = True
+        
+        retry = (not self._last_scan_found and
+                 current_time - self._last_attempt_time >= scan_interval)
+        if not (moved or retry):
+            return frame, last_scan_time, None
+        self._last_attempt_time = current_time
+        
+        # Try to detect QR code
+        try:
+            device_info = qr_scanner.scan(gray)
+            self._last_scan_found = bool(device_info)
+            if device_info:
+                return frame, current_time, device_info
+        except Exception as e:
+            self._last_scan_found = False
+            print(f"Error processing frame: {e}")
+        
+        return frame, last_scan_time, None
 
 def main():
     """Main function to run the ARNet application."""
     print("Initializing ARNet...")
     
+    # Use OpenCV's SIMD code paths and leave cores free for the Python
+    # threads instead of letting its pool claim every core
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(max(1, (os.cpu_count() or 2) // 2))
+    
     # Initialize camera with optimized settings
     camera = cv2.VideoCapture(0, cv2.CAP_DSHOW)
     if not camera.isOpened():
@@ -105,17 +272,19 @@ def main():
     camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
     camera.set(cv2.CAP_PROP_FPS, 30)
     camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+    # Keep at most one frame queued in the driver so reads stay current
+    camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
     
-    qr_scanner = QRScanner()
+    # Decode on the scanner's own thread so the camera loop never waits
+    qr_scanner = QRScanner(background=True)
     device_resolver = DeviceResolver()
     ar_overlay = AROverlay()
     
-    current_device = None
-    current_diagnostics = None
     last_scan_time = 0
-    last_ping_time = 0
     scan_interval = 2.0  # seconds between QR scans
     ping_interval = 3.0  # seconds between pings
+    frame_processor = FrameProcessor(640, 480)
+    worker = DiagnosticsWorker(device_resolver, ping_interval)
     frame_count = 0
     skip_frames = 2
     
@@ -128,7 +297,10 @@ def main():
     print("c - Clear current device")
     
     while True:
-        ret, frame = camera.read()
+        # grab() is cheap; only the frame actually shown gets decoded
+        ret = camera.grab()
+        if ret:
+            ret, frame = camera.retrieve()
         if not ret:
             print("Error: Could not read frame!")
             break
@@ -136,42 +308,20 @@ def main():
         if frame_count % (skip_frames + 1) != 0:
             cv2.imshow("ARNet", frame)
             continue
-        # QR scan
-        current_time = time.time()
-        device_info = None
-        if current_time - last_scan_time >= scan_interval:
-            device_info = qr_scanner.scan(frame)
-            last_scan_time = current_time
-            if device_info:
-                device_id = device_info.get('device_id')
-                if device_id != current_device:
-                    print(f"\nNew device detected: {device_id}")
-                    current_device = device_id
-                    # Immediately ping and get diagnostics
-                    current_diagnostics = device_resolver.get_device_info(device_info)
-                    if current_diagnostics:
-                        print("Device info retrieved:")
-                        print(f"  Type: {current_diagnostics.get('type', 'unknown')}")
-                        print(f"  Location: {current_diagnostics.get('location', 'unknown')}")
-                        ping_stats = current_diagnostics.get('ping', {})
-                        if ping_stats:
-                            print(f"  Ping: {ping_stats.get('avg')}ms (min: {ping_stats.get('min')}ms, max: {ping_stats.get('max')}ms)")
-                            print(f"  Packet Loss: {ping_stats.get('loss')}")
-                    last_ping_time = current_time
-        # Periodically re-ping the device while in view
-        if current_device and (time.time() - last_ping_time >= ping_interval):
-            if current_diagnostics:
-                # Only update ping stats
-                ip = current_diagnostics.get('ip')
-                if ip:
-                    ping_stats = device_resolver.ping(ip)
-                    current_diagnostics['ping'] = ping_stats
-                    print(f"[Re-ping] {current_device} ({ip}): {ping_stats}")
-                    last_ping_time = time.time()
-        # Draw overlay if we have diagnostics
-        display_frame = frame.copy()
+        # QR scan on the downscaled grayscale frame; the worker resolves
+        # and pings devices in the background so the loop never waits on
+        # the network
+        _, last_scan_time, device_info = frame_processor.process_frame(
+            frame, qr_scanner, last_scan_time, scan_interval)
+        if device_info:
+            worker.submit(device_info)
+        current_device = worker.current_device
+        current_diagnostics = worker.latest_diagnostics
+        # Draw overlay if we have diagnostics; it writes into the panel ROI
+        # of the frame in place, and the raw frame is not needed afterwards
+        display_frame = frame
         if current_diagnostics:
-            display_frame = ar_overlay.draw_overlay(display_frame, current_diagnostics)
+            display_frame = ar_overlay.draw_overlay(frame, current_diagnostics)
         cv2.imshow("ARNet", display_frame)
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q'):
@@ -185,15 +335,18 @@ def main():
             print("c - Clear current device")
         elif key == ord('r'):
             last_scan_time = 0
-            current_device = None
-            current_diagnostics = None
+            frame_processor.reset()
+            qr_scanner.clear()
+            worker.clear()
         elif key == ord('s'):
             if current_device:
                 save_frame(display_frame, current_device)
         elif key == ord('c'):
-            current_device = None
-            current_diagnostics = None
+            qr_scanner.clear()
+            worker.clear()
             print("Current device cleared")
+    worker.stop()
+    qr_scanner.stop()
     camera.release()
     cv2.destroyAllWindows()
     print("\nApplication closed and cleaned up.")
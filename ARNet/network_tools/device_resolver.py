@@ -1,10 +1,59 @@
+import asyncio
 import subprocess
 import platform
-import json
 import os
+import re
 import socket
 import time
 from datetime import datetime
+from functools import lru_cache
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    from icmplib import ping as icmp_ping
+    from icmplib import ICMPLibError, SocketPermissionError
+except ImportError:
+    icmp_ping = None
+
+# Round trip time in ping output, e.g. "time=0.45 ms" or Windows "time<1ms"
+_TIME_RE = re.compile(r"time[=<](\d+(?:\.\d+)?)\s*ms")
+
+# Only check essential ports for faster response, plus any device-specific ones
+_ESSENTIAL_PORTS = {
+    80: 'HTTP',
+    443: 'HTTPS'
+}
+
+@lru_cache(maxsize=4)
+def _load_map(path, mtime_ns):
+    """
+    Parse a device map file; cached until the file is modified.
+    
+    Each device also gets an '_all_ports' table of port number to service,
+    merging the essential ports with the device's own, so lookups never
+    have to convert or validate port numbers.
+    """
+    with open(path, 'rb') as f:
+        device_map = json_loads(f.read())
+    
+    for device_id, device in device_map.items():
+        all_ports = dict(_ESSENTIAL_PORTS)
+        for port, service in device.get('ports', {}).items():
+            try:
+                number = int(port)
+                if not 0 <= number <= 65535:
+                    raise ValueError(port)
+            except ValueError:
+                print(f"Invalid port number in device map for {device_id}: {port}")
+                continue
+            all_ports[number] = service
+        device['_all_ports'] = all_ports
+    
+    return device_map
 
 class DeviceResolver:
     def __init__(self):
@@ -17,14 +66,15 @@ class DeviceResolver:
             23: 'Telnet',
             21: 'FTP'
         }
+        # Cleared when the OS refuses unprivileged ICMP sockets
+        self._icmp_available = icmp_ping is not None
 
     def _load_device_map(self):
         """Load device mapping from JSON file."""
         try:
             map_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'device_map.json')
             if os.path.exists(map_path):
-                with open(map_path, 'r') as f:
-                    return json.load(f)
+                return _load_map(map_path, os.stat(map_path).st_mtime_ns)
             return {}
         except Exception as e:
             print(f"Error loading device map: {str(e)}")
@@ -34,6 +84,9 @@ class DeviceResolver:
         """
         Enhanced ping function with multiple attempts and statistics.
         
+        Uses an ICMP socket through icmplib when available and falls back
+        to the system ping command otherwise.
+        
         Args:
             ip: IP address to ping
             count: Number of ping attempts
@@ -41,6 +94,40 @@ class DeviceResolver:
         Returns:
             dict: Ping statistics
         """
+        if self._icmp_available:
+            try:
+                return self._ping_icmp(ip, count)
+            except SocketPermissionError:
+                print("Unprivileged ICMP is not permitted, falling back to the ping command")
+                self._icmp_available = False
+            except (ICMPLibError, ValueError, OSError) as e:
+                # ValueError covers addresses that cannot be encoded, such
+                # as an over-long name from a QR payload
+                print(f"Error pinging device: {str(e)}")
+                return None
+        return self._ping_subprocess(ip, count)
+
+    def _ping_icmp(self, ip, count):
+        """Ping with icmplib; no process spawn or output parsing."""
+        host = icmp_ping(ip, count=count, interval=0.2, timeout=1, privileged=False)
+        if not host.is_alive:
+            return {
+                'avg': None,
+                'min': None,
+                'max': None,
+                'loss': '100%',
+                'status': 'down'
+            }
+        return {
+            'avg': round(host.avg_rtt, 2),
+            'min': round(host.min_rtt, 2),
+            'max': round(host.max_rtt, 2),
+            'loss': f"{host.packet_loss * 100}%",
+            'status': 'up'
+        }
+
+    def _ping_subprocess(self, ip, count):
+        """Ping with the system ping command and parse its output."""
         try:
             # Windows ping command with shorter timeout
             if platform.system().lower() == "windows":
@@ -54,34 +141,23 @@ class DeviceResolver:
                                  timeout=2)  # Overall timeout of 2 seconds
             
             # Parse ping statistics
-            output = result.stdout
-            times = []
+            times = [float(t) for t in _TIME_RE.findall(result.stdout)]
             packet_loss = "100%"
             
-            if "time=" in output:
-                # Extract ping times
-                for line in output.split('\n'):
-                    if "time=" in line:
-                        try:
-                            time_str = line.split("time=")[1].split("ms")[0].strip()
-                            times.append(float(time_str))
-                        except:
-                            continue
+            # Calculate statistics
+            if times:
+                avg_time = sum(times) / len(times)
+                min_time = min(times)
+                max_time = max(times)
+                packet_loss = f"{(1 - len(times)/count) * 100}%"
                 
-                # Calculate statistics
-                if times:
-                    avg_time = sum(times) / len(times)
-                    min_time = min(times)
-                    max_time = max(times)
-                    packet_loss = f"{(1 - len(times)/count) * 100}%"
-                    
-                    return {
-                        'avg': round(avg_time, 2),
-                        'min': round(min_time, 2),
-                        'max': round(max_time, 2),
-                        'loss': packet_loss,
-                        'status': 'up'
-                    }
+                return {
+                    'avg': round(avg_time, 2),
+                    'min': round(min_time, 2),
+                    'max': round(max_time, 2),
+                    'loss': packet_loss,
+                    'status': 'up'
+                }
             
             return {
                 'avg': None,
@@ -115,6 +191,26 @@ class DeviceResolver:
         except:
             return False
 
+    async def _check_port_async(self, ip, port, timeout=0.5):
+        """Check if a port is open without tying up a thread while waiting."""
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except (asyncio.TimeoutError, OSError, ValueError, OverflowError):
+            # ValueError/OverflowError come from a bad host name or port;
+            # only this port is reported closed, not the whole scan lost
+            return port, False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return port, True
+
+    async def _scan_ports(self, ip, ports):
+        """Check all ports concurrently; returns a dict of port to open flag."""
+        results = await asyncio.gather(*[self._check_port_async(ip, port) for port in ports])
+        return dict(results)
+
     def get_device_info(self, device_info):
         """
         Get comprehensive device information including enhanced diagnostics.
@@ -151,34 +247,17 @@ class DeviceResolver:
                     'status': 'down'
                 }
             
-            # Only check essential ports for faster response
-            essential_ports = {
-                80: 'HTTP',
-                443: 'HTTPS'
-            }
+            all_ports = device_details['_all_ports']
             
-            # Check essential ports
+            # Check all ports concurrently on a single thread
+            open_ports = asyncio.run(self._scan_ports(ip, all_ports))
             ports = {}
-            for port, service in essential_ports.items():
-                is_open = self.check_port(ip, port)
+            for port, service in all_ports.items():
                 ports[port] = {
                     'service': service,
-                    'status': 'open' if is_open else 'closed'
+                    'status': 'open' if open_ports[port] else 'closed'
                 }
             
-            # Add device-specific ports if available
-            device_ports = device_details.get('ports', {})
-            for port, service in device_ports.items():
-                try:
-                    port_num = int(port)
-                    is_open = self.check_port(ip, port_num)
-                    ports[port_num] = {
-                        'service': service,
-                        'status': 'open' if is_open else 'closed'
-                    }
-                except ValueError:
-                    print(f"Invalid port number in device map: {port}")
-            
             # Build enhanced diagnostics
             diagnostics = {
                 'device_id': device_id,
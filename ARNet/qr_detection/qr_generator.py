@@ -1,8 +1,19 @@
 import qrcode
 import json
 import os
+import numpy as np
+from PIL import Image
 
-def generate_qr_code(device_id, ip, output_dir="data/qr_samples"):
+def create_qr():
+    """Create a QR object with the settings used for device labels."""
+    return qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4
+    )
+
+def generate_qr_code(device_id, ip, output_dir="data/qr_samples", qr=None):
     """
     Generate a QR code for a network device.
     
@@ -10,6 +21,8 @@ def generate_qr_code(device_id, ip, output_dir="data/qr_samples"):
         device_id: Device identifier (e.g., 'SW1')
         ip: Device IP address
         output_dir: Directory to save QR code images
+        qr: QR object from create_qr() to reuse across a batch; a new one
+            is created if omitted
     """
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
@@ -23,20 +36,23 @@ def generate_qr_code(device_id, ip, output_dir="data/qr_samples"):
     # Convert to JSON string
     json_data = json.dumps(device_info)
     
-    # Create QR object with simpler settings
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4
-    )
+    # Create QR object with simpler settings, or reset the shared one; the
+    # payload usually needs more than version 1, so fit from the smallest
+    if qr is None:
+        qr = create_qr()
+    else:
+        qr.clear()
+        qr.version = None
     
     # Add data and make QR code
     qr.add_data(json_data)
     qr.make(fit=True)
     
-    # Create image with black and white colors
-    qr_image = qr.make_image(fill_color="black", back_color="white")
+    # Create image with black and white colors by scaling the module matrix
+    # (border included) up to pixels instead of drawing each box
+    modules = np.array(qr.get_matrix(), dtype=bool)
+    pixels = np.repeat(np.repeat(~modules, qr.box_size, axis=0), qr.box_size, axis=1)
+    qr_image = Image.fromarray(pixels)
     
     # Save QR code
     output_path = os.path.join(output_dir, f"{device_id}_qr.png")
@@ -55,9 +71,10 @@ def main():
     ]
     
     print("Generating QR codes for network devices...")
+    qr = create_qr()
     for device_id, ip in test_devices:
         print(f"\nGenerating QR code for {device_id}...")
-        generate_qr_code(device_id, ip)
+        generate_qr_code(device_id, ip, qr=qr)
     
     print("\nAll QR codes have been generated!")
     print("You can find them in the 'data/qr_samples' directory.")
@@ -0,0 +1,99 @@
+from ctypes import c_void_p, string_at
+import numpy as np
+from pyzbar.pyzbar_error import PyZbarError
+
+try:
+    from pyzbar.wrapper import (
+        ZBarConfig, ZBarSymbol,
+        zbar_image_create, zbar_image_destroy, zbar_image_first_symbol,
+        zbar_image_scanner_create, zbar_image_scanner_destroy,
+        zbar_image_scanner_set_config, zbar_image_set_data,
+        zbar_image_set_format, zbar_image_set_size, zbar_scan_image,
+        zbar_symbol_get_data, zbar_symbol_get_data_length,
+        zbar_symbol_get_loc_size, zbar_symbol_get_loc_x, zbar_symbol_get_loc_y,
+    )
+    HAVE_BINDINGS = True
+except ImportError:
+    # pyzbar releases that lay out their ctypes bindings differently
+    HAVE_BINDINGS = False
+
+# zbar's fourcc for 8-bit grayscale pixels ('Y800')
+_FOURCC_Y800 = 0x30303859
+
+class ZBarDecoder:
+    """Decode QR codes by calling libzbar directly."""
+
+    def __init__(self):
+        """
+        Create the zbar scanner and image reused for every decode.
+        
+        Calls go through pyzbar's ctypes bindings directly: only QR codes
+        are enabled, the pixels are handed over without a copy, and only
+        the payload and corners of the first symbol are read back.
+        """
+        self._scanner = None
+        self._image = None
+        
+        scanner = zbar_image_scanner_create()
+        if not scanner:
+            raise PyZbarError('Could not create image scanner')
+        self._scanner = scanner
+        # Symbology 0 applies the setting to every symbology
+        zbar_image_scanner_set_config(scanner, 0, ZBarConfig.CFG_ENABLE, 0)
+        zbar_image_scanner_set_config(scanner, ZBarSymbol.QRCODE, ZBarConfig.CFG_ENABLE, 1)
+        
+        image = zbar_image_create()
+        if not image:
+            self.close()
+            raise PyZbarError('Could not create zbar image')
+        self._image = image
+        zbar_image_set_format(image, _FOURCC_Y800)
+
+    def decode_first(self, gray):
+        """
+        Decode the first QR code in a grayscale image.
+        
+        Args:
+            gray: Single-channel uint8 image
+            
+        Returns:
+            tuple: (payload bytes, (x, y, w, h)) or None if no QR code found
+        """
+        # zbar reads rows back to back from the buffer pointer
+        if not gray.flags['C_CONTIGUOUS']:
+            gray = np.ascontiguousarray(gray)
+        height, width = gray.shape
+        
+        # zbar keeps no reference to the pixels past the scan, and the
+        # previous frame's symbols are recycled by the next scan
+        image = self._image
+        zbar_image_set_size(image, width, height)
+        zbar_image_set_data(image, c_void_p(gray.ctypes.data), gray.size, None)
+        if zbar_scan_image(self._scanner, image) < 0:
+            raise PyZbarError('Unsupported image format')
+        
+        symbol = zbar_image_first_symbol(image)
+        if not symbol:
+            return None
+        data = string_at(zbar_symbol_get_data(symbol),
+                         zbar_symbol_get_data_length(symbol))
+        xs = []
+        ys = []
+        for i in range(zbar_symbol_get_loc_size(symbol)):
+            xs.append(zbar_symbol_get_loc_x(symbol, i))
+            ys.append(zbar_symbol_get_loc_y(symbol, i))
+        if not xs:
+            return data, (0, 0, 0, 0)
+        return data, (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+
+    def close(self):
+        """Release the zbar image and scanner."""
+        if self._image:
+            zbar_image_destroy(self._image)
+            self._image = None
+        if self._scanner:
+            zbar_image_scanner_destroy(self._scanner)
+            self._scanner = None
+
+    def __del__(self):
+        self.close()